@@ -0,0 +1,143 @@
+"""Mesure la RSS du cache gateway de discord.py sur un ensemble simulé de grosses guildes.
+
+Chaque mode (normal puis basse mémoire) tourne dans un sous-processus séparé, construit son client avec
+`client_options` comme `MyBot`, puis reçoit le même flux synthétique GUILD_CREATE / MESSAGE_CREATE, filtré
+par ses intents comme le ferait Discord. Aucune connexion réseau n'est ouverte.
+
+Usage: python -m bot.bench.gateway_memory [--guilds 2000] [--channels 30] [--voice 20] [--messages 5000]
+"""
+import argparse
+import gc
+import json
+import resource
+import subprocess
+import sys
+from types import SimpleNamespace
+
+JOINED_AT = "2024-01-01T00:00:00+00:00"
+SELF_ID = 1
+
+
+def rss_kib() -> int:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    # ru_maxrss est un pic (en Kio sous Linux), à défaut de mieux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _user(user_id: int) -> dict:
+    return {"id": str(user_id), "username": f"user{user_id}", "discriminator": "0", "avatar": None,
+            "global_name": None}
+
+
+def _member(user_id: int) -> dict:
+    return {"user": _user(user_id), "roles": [], "joined_at": JOINED_AT, "deaf": False, "mute": False, "flags": 0}
+
+
+def guild_payload(guild_id: int, args, with_voice: bool, with_expressions: bool) -> dict:
+    base = guild_id * 100_000
+    text_channels = [{"id": str(base + i), "type": 0, "name": f"salon-{i}", "position": i,
+                      "permission_overwrites": []} for i in range(1, args.channels + 1)]
+    voice_channel = {"id": str(base + args.channels + 1), "type": 2, "name": "vocal", "position": 0,
+                     "permission_overwrites": [], "bitrate": 64000, "user_limit": 0}
+    roles = [{"id": str(guild_id if i == 0 else base + 50_000 + i), "name": f"role-{i}", "permissions": "0",
+              "position": i, "color": 0, "hoist": False, "managed": False, "mentionable": False}
+             for i in range(args.roles)]
+    voice_users = [base + 90_000 + i for i in range(args.voice)] if with_voice else []
+    return {
+        "id": str(guild_id), "name": f"guild-{guild_id}", "owner_id": str(base + 90_000), "large": True,
+        "member_count": 5000, "features": [], "unavailable": False,
+        "roles": roles,
+        "channels": text_channels + [voice_channel],
+        "emojis": [{"id": str(base + 70_000 + i), "name": f"emoji{i}", "roles": [], "require_colons": True,
+                    "managed": False, "animated": False, "available": True}
+                   for i in range(args.emojis)] if with_expressions else [],
+        "stickers": [],
+        "members": [_member(SELF_ID)] + [_member(uid) for uid in voice_users],
+        "voice_states": [{"user_id": str(uid), "channel_id": voice_channel["id"], "session_id": "s", "deaf": False,
+                          "mute": False, "self_deaf": False, "self_mute": False, "self_video": False,
+                          "suppress": False, "request_to_speak_timestamp": None} for uid in voice_users],
+        "threads": [], "presences": [], "stage_instances": [], "guild_scheduled_events": [],
+    }
+
+
+def message_payload(n: int, args) -> dict:
+    guild_id = 10 + n % args.guilds
+    channel_id = guild_id * 100_000 + 1 + n % args.channels
+    author_id = 5_000_000 + n
+    return {
+        "id": str(10_000_000 + n), "channel_id": str(channel_id), "guild_id": str(guild_id),
+        "author": _user(author_id),
+        "member": {"roles": [], "joined_at": JOINED_AT, "deaf": False, "mute": False, "flags": 0},
+        "content": "x" * 200, "timestamp": JOINED_AT, "edited_timestamp": None, "tts": False,
+        "mention_everyone": False, "mentions": [], "mention_roles": [], "attachments": [], "embeds": [],
+        "pinned": False, "type": 0,
+    }
+
+
+def measure(low_memory: bool, args) -> dict:
+    import discord
+    from ..bot import client_options
+
+    client = discord.Client(**client_options(SimpleNamespace(low_memory=low_memory)))
+    state = client._connection
+    state.user = discord.ClientUser(state=state, data=_user(SELF_ID))
+    intents = state._intents
+    gc.collect()
+    before = rss_kib()
+
+    for i in range(args.guilds):
+        state._add_guild_from_data(guild_payload(10 + i, args, intents.voice_states, intents.emojis_and_stickers))
+    if intents.guild_messages:
+        for n in range(args.messages):
+            state.parse_message_create(message_payload(n, args))
+    gc.collect()
+    after = rss_kib()
+
+    return {
+        "mode": "basse mémoire" if low_memory else "normal",
+        "before_kib": before,
+        "after_kib": after,
+        "guilds": len(state._guilds),
+        "members": sum(len(g._members) for g in state._guilds.values()),
+        "messages": len(state._messages) if state._messages is not None else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--guilds", type=int, default=2000)
+    parser.add_argument("--channels", type=int, default=30)
+    parser.add_argument("--roles", type=int, default=20)
+    parser.add_argument("--emojis", type=int, default=20)
+    parser.add_argument("--voice", type=int, default=20, help="membres en vocal par guilde")
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--worker", choices=("normal", "low"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(measure(args.worker == "low", args)))
+        return
+
+    forwarded = sys.argv[1:]
+    results = []
+    for mode in ("normal", "low"):
+        out = subprocess.run([sys.executable, "-m", "bot.bench.gateway_memory", *forwarded, "--worker", mode],
+                             check=True, capture_output=True, text=True).stdout
+        results.append(json.loads(out.strip().splitlines()[-1]))
+
+    print(f"{args.guilds} guildes, {args.channels} salons, {args.voice} membres en vocal, {args.messages} messages")
+    print(f"{'mode':<15}{'RSS avant':>12}{'RSS après':>12}{'delta':>12}{'membres':>10}{'messages':>10}")
+    for r in results:
+        delta = r["after_kib"] - r["before_kib"]
+        print(f"{r['mode']:<15}{r['before_kib'] / 1024:>10.1f}Mo{r['after_kib'] / 1024:>10.1f}Mo"
+              f"{delta / 1024:>10.1f}Mo{r['members']:>10}{r['messages']:>10}")
+
+
+if __name__ == "__main__":
+    main()
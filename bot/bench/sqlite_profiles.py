@@ -0,0 +1,133 @@
+"""Compare les profils SQLite (durable, balanced, throughput) sur une charge synthétique type commandes `Budget`.
+
+Chaque profil tourne dans un sous-processus sur une base temporaire neuve. La charge alterne écritures
+(/sub add, /pay add, /bank add, /pay done) et lectures (/sub list, /pay list, /bank show, /reste) via
+`BudgetService`, qui commit après chaque écriture comme en production. Le nombre de fsync/fdatasync est
+relevé avec `strace -c` s'il est installé, sinon affiché "n/d".
+
+Usage: python -m bot.bench.sqlite_profiles [--users 50] [--rounds 20] [--profiles durable,balanced]
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from ..db import PROFILES, Database
+from ..services.budget_service import BudgetService
+
+
+async def run_workload(profile: str, path: str, users: int, rounds: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    db = Database(path, profile)
+    await db.connect()
+    service = BudgetService(db.conn)
+    await service.ensure_schema()
+    today = date.today()
+
+    write_times: list[float] = []
+    read_latencies: list[float] = []
+
+    async def write(coro):
+        start = time.perf_counter()
+        await coro
+        write_times.append(time.perf_counter() - start)
+
+    async def read(coro):
+        start = time.perf_counter()
+        await coro
+        read_latencies.append(time.perf_counter() - start)
+
+    try:
+        for _ in range(rounds):
+            for user_id in range(1, users + 1):
+                due = (today + timedelta(days=rng.randint(0, 20))).isoformat()
+                await write(service.add_subscription(user_id, f"sub-{rng.randint(1, 999)}", rng.randint(100, 5000),
+                                                     rng.randint(1, 28)))
+                await write(service.add_expense(user_id, f"exp-{rng.randint(1, 999)}", rng.randint(100, 50000), due))
+                await write(service.add_to_balance(user_id, rng.randint(-5000, 20000)))
+                expenses = await service.list_unpaid_expenses(user_id)
+                if expenses:
+                    await write(service.mark_expense_paid(user_id, rng.choice(list(expenses)).id))
+                await read(service.list_subscriptions(user_id))
+                await read(service.list_unpaid_expenses(user_id))
+                await read(service.get_balance(user_id))
+                await read(service.remaining_for_month(user_id, today))
+    finally:
+        await db.close()
+
+    ordered = sorted(read_latencies)
+
+    def pct(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000
+
+    return {
+        "profile": profile,
+        "writes": len(write_times),
+        "writes_per_s": len(write_times) / sum(write_times) if write_times else 0.0,
+        "reads": len(read_latencies),
+        "read_p50_ms": statistics.median(read_latencies) * 1000,
+        "read_p95_ms": pct(0.95),
+        "read_p99_ms": pct(0.99),
+    }
+
+
+def parse_strace_summary(path: str) -> int:
+    """Somme des appels fsync/fdatasync dans la sortie de `strace -c`."""
+    total = 0
+    with open(path) as f:
+        for line in f:
+            fields = line.split()
+            if fields and fields[-1] in ("fsync", "fdatasync") and len(fields) >= 5:
+                total += int(fields[3])
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--profiles", default=",".join(PROFILES))
+    parser.add_argument("--dir", help="répertoire des bases temporaires (le disque mesuré)")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        path = os.path.join(args.dir, f"{args.worker}.db")
+        print(json.dumps(asyncio.run(run_workload(args.worker, path, args.users, args.rounds, args.seed))))
+        return
+
+    strace = shutil.which("strace")
+    results = []
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        for profile in args.profiles.split(","):
+            cmd = [sys.executable, "-m", "bot.bench.sqlite_profiles", "--users", str(args.users),
+                   "--rounds", str(args.rounds), "--seed", str(args.seed), "--dir", tmp, "--worker", profile]
+            summary = os.path.join(tmp, f"{profile}.strace")
+            if strace:
+                cmd = [strace, "-f", "-c", "-e", "trace=fsync,fdatasync", "-o", summary, *cmd]
+            out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+            result = json.loads(out.strip().splitlines()[-1])
+            result["fsyncs"] = parse_strace_summary(summary) if strace else None
+            results.append(result)
+
+    print(f"{args.users} utilisateurs x {args.rounds} tours")
+    print(f"{'profil':<12}{'écritures/s':>13}{'lect. p50':>11}{'lect. p95':>11}{'lect. p99':>11}{'fsync':>9}")
+    for r in results:
+        fsyncs = "n/d" if r["fsyncs"] is None else str(r["fsyncs"])
+        print(f"{r['profile']:<12}{r['writes_per_s']:>13.0f}{r['read_p50_ms']:>9.2f}ms{r['read_p95_ms']:>9.2f}ms"
+              f"{r['read_p99_ms']:>9.2f}ms{fsyncs:>9}")
+    if not strace:
+        print("strace introuvable: nombre de fsync non mesuré.")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,11 +11,27 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-class MyBot(commands.Bot):
-    def __init__(self, config, db: Database):
+def client_options(config) -> dict:
+    """Options passées à discord.py selon la configuration.
+
+    En mode basse mémoire, le bot (uniquement slash commands) ne garde que l'intent `guilds`,
+    sans cache de messages, sans chunking des membres et sans cache de membres hormis le bot lui-même.
+    """
+    if not getattr(config, "low_memory", False):
         intents = discord.Intents.default()
         intents.message_content = True
-        super().__init__(command_prefix=config.prefix, intents=intents)
+        return {"intents": intents}
+    return {
+        "intents": discord.Intents(guilds=True),
+        "max_messages": None,
+        "chunk_guilds_at_startup": False,
+        "member_cache_flags": discord.MemberCacheFlags.none(),
+    }
+
+
+class MyBot(commands.Bot):
+    def __init__(self, config, db: Database):
+        super().__init__(command_prefix=config.prefix, **client_options(config))
         self.config = config
         self.db = db
 
@@ -36,7 +52,7 @@ class MyBot(commands.Bot):
 
 def run():
     config = get_config()
-    db = Database(config.database)
+    db = Database(config.database, config.db_profile, config.db_pragmas)
 
     bot = MyBot(config, db)
 
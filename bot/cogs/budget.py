@@ -1,4 +1,5 @@
-from datetime import datetime
+import logging
+from datetime import datetime, timezone
 from typing import TYPE_CHECKING, Optional
 
 import discord
@@ -6,11 +7,14 @@ from discord import app_commands
 from discord.ext import commands, tasks
 
 from ..services.budget_service import BudgetService
+from ..services.recurrence import RecurrenceRule
 from ..utils.money import parse_amount_to_cents, format_cents
 
 if TYPE_CHECKING:
     from ..bot import MyBot
 
+logger = logging.getLogger(__name__)
+
 
 class Budget(commands.Cog):
     INFO_COLOR = 0x2B6CB0
@@ -23,6 +27,12 @@ class Budget(commands.Cog):
             return ""
         return text if len(text) <= limit else text[: max(0, limit - 1)] + "…"
 
+    @staticmethod
+    def _quiet_suffix(quiet: bool, lookahead_days: int) -> str:
+        if not quiet:
+            return ""
+        return f"\nUniquement si changement ou échéance dans {lookahead_days} jour(s)"
+
     @classmethod
     def _embed(cls, title: Optional[str] = None, description: Optional[str] = None, *,
                color: Optional[int] = None) -> discord.Embed:
@@ -86,14 +96,74 @@ class Budget(commands.Cog):
 
     @group_sub.command(name="add", description="Ajouter un abonnement")
     @app_commands.describe(name="Nom de l'abonnement", amount="Montant (ex: 12.99)",
-                           day_of_month="Jour du mois (1..28)")
+                           day_of_month="Jour du mois (1..28), pour une fréquence mensuelle",
+                           frequency="Fréquence (mensuelle par défaut)",
+                           interval="Tous les N mois/semaines/ans (1 par défaut)",
+                           start_date="Première échéance AAAA-MM-JJ (aujourd'hui par défaut)",
+                           last_day="Prélevé le dernier jour du mois")
+    @app_commands.choices(frequency=[app_commands.Choice(name="mensuelle", value="monthly"),
+                                     app_commands.Choice(name="hebdomadaire", value="weekly"),
+                                     app_commands.Choice(name="annuelle", value="yearly")])
     async def sub_add(self, interaction: discord.Interaction, name: str, amount: str,
-                      day_of_month: app_commands.Range[int, 1, 28]):
+                      day_of_month: Optional[app_commands.Range[int, 1, 28]] = None,
+                      frequency: Optional[app_commands.Choice[str]] = None,
+                      interval: app_commands.Range[int, 1, 52] = 1,
+                      start_date: Optional[str] = None,
+                      last_day: bool = False):
         await interaction.response.defer(ephemeral=True)
         amount_cents = parse_amount_to_cents(amount)
-        await self.service.add_subscription(interaction.user.id, name, amount_cents, int(day_of_month))
+        freq = frequency.value if frequency else "monthly"
+        try:
+            anchor = datetime.strptime(start_date, "%Y-%m-%d").date() if start_date else None
+        except ValueError:
+            emb = self._embed(title="Date invalide", description="Format attendu AAAA-MM-JJ.", color=self.WARN_COLOR)
+            await interaction.followup.send(embed=emb, ephemeral=True)
+            return
+        if freq != "monthly" and day_of_month is not None:
+            emb = self._embed(title="Option incompatible",
+                              description="day_of_month ne s'applique qu'aux abonnements mensuels; utilisez start_date "
+                                          "pour fixer le jour de semaine ou la date annuelle.",
+                              color=self.WARN_COLOR)
+            await interaction.followup.send(embed=emb, ephemeral=True)
+            return
+        if freq == "weekly" and last_day:
+            emb = self._embed(title="Option incompatible",
+                              description="last_day ne s'applique pas aux abonnements hebdomadaires.",
+                              color=self.WARN_COLOR)
+            await interaction.followup.send(embed=emb, ephemeral=True)
+            return
+        if day_of_month is not None and last_day:
+            emb = self._embed(title="Option incompatible",
+                              description="Choisissez soit day_of_month, soit last_day.",
+                              color=self.WARN_COLOR)
+            await interaction.followup.send(embed=emb, ephemeral=True)
+            return
+        if freq == "monthly" and day_of_month is None and not last_day:
+            if anchor is None:
+                emb = self._embed(title="Jour requis",
+                                  description="Indiquez day_of_month, start_date ou last_day pour un abonnement "
+                                              "mensuel.",
+                                  color=self.WARN_COLOR)
+                await interaction.followup.send(embed=emb, ephemeral=True)
+                return
+            if anchor.day > 28:
+                emb = self._embed(title="Jour invalide",
+                                  description="Jour du mois limité à 28; utilisez last_day pour le dernier jour "
+                                              "du mois.",
+                                  color=self.WARN_COLOR)
+                await interaction.followup.send(embed=emb, ephemeral=True)
+                return
+            day_of_month = anchor.day
+        if anchor is None and (freq != "monthly" or int(interval) > 1):
+            anchor = datetime.now(timezone.utc).date()
+        if day_of_month is None:
+            # Pour les règles non mensuelles ou last_day, day_of_month ne sert qu'au tri.
+            day_of_month = 28 if last_day or anchor is None else min(anchor.day, 28)
+        rule = RecurrenceRule(frequency=freq, interval=int(interval), day_of_month=int(day_of_month),
+                              anchor=anchor, last_day=last_day)
+        await self.service.add_subscription(interaction.user.id, name, amount_cents, int(day_of_month), rule)
         emb = self._embed(title="Abonnement ajouté",
-                          description=f"{name} {format_cents(amount_cents)} le {int(day_of_month)}",
+                          description=f"{name} {format_cents(amount_cents)} {rule.describe()}",
                           color=self.SUCCESS_COLOR)
         await interaction.followup.send(embed=emb, ephemeral=True)
 
@@ -105,7 +175,7 @@ class Budget(commands.Cog):
             emb = self._embed(title="Abonnements", description="Aucun abonnement.")
             await interaction.followup.send(embed=emb, ephemeral=True)
             return
-        lines = [f"{s.name}: {format_cents(s.amount_cents)} le {s.day_of_month} ({'actif' if s.active else 'inactif'})"
+        lines = [f"{s.name}: {format_cents(s.amount_cents)} {s.rule.describe()} ({'actif' if s.active else 'inactif'})"
                  for s in subs]
         emb = self._embed(title="Vos abonnements", description="\n".join(lines))
         await interaction.followup.send(embed=emb, ephemeral=True)
@@ -185,6 +255,11 @@ class Budget(commands.Cog):
             for name, cents, due in mans:
                 desc_lines.append(f"- {name} pour le {due}: {format_cents(cents)}")
         desc_lines.append(f"Total restant ce mois: {format_cents(total)}")
+        group = await self.service.get_user_group(interaction.user.id)
+        if group:
+            totals = await self.service.group_totals(group.id)
+            desc_lines.append(f"Total restant du groupe {group.name} ({totals.members} membres): "
+                              f"{format_cents(totals.remaining_cents)}")
         emb = self._embed(title="Reste à payer ce mois", description="\n".join(desc_lines))
         await interaction.followup.send(embed=emb, ephemeral=True)
 
@@ -194,11 +269,14 @@ class Budget(commands.Cog):
 
     @group_reminder.command(name="set", description="Définir le mode de rappel (mp ou channel)")
     @app_commands.describe(mode="Choisissez 'dm' pour message privé, 'channel' pour poster dans un salon",
-                           channel="Salon où poster si mode=channel")
+                           channel="Salon où poster si mode=channel",
+                           quiet="N'envoyer que si le rappel a changé ou si une échéance approche",
+                           lookahead_days="En mode quiet, jours avant une échéance pour rappeler quand même")
     @app_commands.choices(
         mode=[app_commands.Choice(name="dm", value="dm"), app_commands.Choice(name="channel", value="channel")])
     async def reminder_set(self, interaction: discord.Interaction, mode: app_commands.Choice[str],
-                           channel: Optional[discord.TextChannel] = None):
+                           channel: Optional[discord.TextChannel] = None, quiet: bool = False,
+                           lookahead_days: app_commands.Range[int, 0, 31] = 3):
         await interaction.response.defer(ephemeral=True)
         chosen = mode.value.lower()
         if chosen not in ("dm", "channel"):
@@ -213,13 +291,14 @@ class Budget(commands.Cog):
                 await interaction.followup.send(embed=emb, ephemeral=True)
                 return
             chan_id = channel.id
-        await self.service.set_reminder_pref(interaction.user.id, chosen, chan_id)
+        await self.service.set_reminder_pref(interaction.user.id, chosen, chan_id, quiet, int(lookahead_days))
+        suffix = self._quiet_suffix(quiet, int(lookahead_days))
         if chosen == 'dm':
-            emb = self._embed(title="Rappel configuré", description="Mode: message privé à 8h",
+            emb = self._embed(title="Rappel configuré", description="Mode: message privé à 8h" + suffix,
                               color=self.SUCCESS_COLOR)
             await interaction.followup.send(embed=emb, ephemeral=True)
         else:
-            emb = self._embed(title="Rappel configuré", description=f"Mode: salon #{channel.name} à 8h",
+            emb = self._embed(title="Rappel configuré", description=f"Mode: salon #{channel.name} à 8h" + suffix,
                               color=self.SUCCESS_COLOR)
             await interaction.followup.send(embed=emb, ephemeral=True)
 
@@ -231,19 +310,25 @@ class Budget(commands.Cog):
             emb = self._embed(title="Rappel", description="Aucune configuration de rappel trouvée pour vous.")
             await interaction.followup.send(embed=emb, ephemeral=True)
             return
-        mode, chan = pref
+        mode, chan, quiet, lookahead_days = pref
+        suffix = self._quiet_suffix(quiet, lookahead_days)
         if mode == 'dm':
-            emb = self._embed(title="Rappel", description="Mode: message privé à 8h")
+            emb = self._embed(title="Rappel", description="Mode: message privé à 8h" + suffix)
             await interaction.followup.send(embed=emb, ephemeral=True)
         else:
-            emb = self._embed(title="Rappel", description=f"Mode: salon (channel_id={chan}) à 8h")
+            emb = self._embed(title="Rappel", description=f"Mode: salon (channel_id={chan}) à 8h" + suffix)
             await interaction.followup.send(embed=emb, ephemeral=True)
 
     @group_bank.command(name="show", description="Afficher votre solde actuel")
     async def bank_show(self, interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)
         balance = await self.service.get_balance(interaction.user.id)
-        emb = self._embed(title="Solde actuel", description=format_cents(balance))
+        desc = format_cents(balance)
+        group = await self.service.get_user_group(interaction.user.id)
+        if group:
+            totals = await self.service.group_totals(group.id)
+            desc += f"\nSolde du groupe {group.name} ({totals.members} membres): {format_cents(totals.balance_cents)}"
+        emb = self._embed(title="Solde actuel", description=desc)
         await interaction.followup.send(embed=emb, ephemeral=True)
 
     @group_bank.command(name="set", description="Définir votre solde")
@@ -273,6 +358,86 @@ class Budget(commands.Cog):
         emb = self._embed(title="Solde mis à jour", description=format_cents(new_balance), color=self.SUCCESS_COLOR)
         await interaction.followup.send(embed=emb, ephemeral=True)
 
+    async def _dm_target(self, user_id: int) -> Optional[discord.abc.Messageable]:
+        # En mode basse mémoire, on ouvre le MP sans récupérer l'utilisateur; discord.py réutilise son cache
+        # borné de salons privés.
+        if self.bot.config.low_memory:
+            return await self.bot.create_dm(discord.Object(id=user_id))
+        return self.bot.get_user(user_id) or await self.bot.fetch_user(user_id)
+
+    def _channel_target(self, channel_id: int) -> Optional[discord.abc.Messageable]:
+        if self.bot.config.low_memory:
+            return self.bot.get_partial_messageable(channel_id)
+        ch = self.bot.get_channel(channel_id)
+        if isinstance(ch, (discord.TextChannel, discord.Thread)):
+            return ch
+        return None
+
+    group_household = app_commands.Group(name="group", description="Gérer un budget partagé (foyer)")
+
+    @group_household.command(name="create", description="Créer un groupe de budget partagé")
+    @app_commands.describe(name="Nom du groupe")
+    async def household_create(self, interaction: discord.Interaction, name: str):
+        await interaction.response.defer(ephemeral=True)
+        group = await self.service.create_group(interaction.user.id, name)
+        emb = self._embed(title="Groupe créé",
+                          description=f"{group.name} (#{group.id}). Partagez ce code avec les membres de votre foyer: "
+                                      f"/group join code:{group.invite_code}",
+                          color=self.SUCCESS_COLOR)
+        await interaction.followup.send(embed=emb, ephemeral=True)
+
+    @group_household.command(name="join", description="Rejoindre un groupe de budget partagé")
+    @app_commands.describe(code="Code d'invitation donné par le propriétaire du groupe")
+    async def household_join(self, interaction: discord.Interaction, code: str):
+        await interaction.response.defer(ephemeral=True)
+        group = await self.service.join_group(interaction.user.id, code)
+        if group is None:
+            emb = self._embed(title="Code invalide", description="Aucun groupe ne correspond à ce code d'invitation.",
+                              color=self.WARN_COLOR)
+            await interaction.followup.send(embed=emb, ephemeral=True)
+            return
+        emb = self._embed(title="Groupe rejoint", description=f"{group.name} (#{group.id})", color=self.SUCCESS_COLOR)
+        await interaction.followup.send(embed=emb, ephemeral=True)
+
+    @group_household.command(name="invite", description="Afficher ou régénérer le code d'invitation (propriétaire)")
+    @app_commands.describe(regenerate="Invalider l'ancien code et en créer un nouveau")
+    async def household_invite(self, interaction: discord.Interaction, regenerate: bool = False):
+        await interaction.response.defer(ephemeral=True)
+        group = await self.service.get_user_group(interaction.user.id)
+        if group is None or group.owner_id != str(interaction.user.id):
+            emb = self._embed(title="Accès refusé", description="Seul le propriétaire du groupe peut inviter.",
+                              color=self.WARN_COLOR)
+            await interaction.followup.send(embed=emb, ephemeral=True)
+            return
+        if regenerate or not group.invite_code:
+            group = await self.service.regenerate_invite(interaction.user.id)
+        emb = self._embed(title=f"Invitation {group.name}", description=f"/group join code:{group.invite_code}")
+        await interaction.followup.send(embed=emb, ephemeral=True)
+
+    @group_household.command(name="show", description="Afficher votre groupe et ses totaux")
+    async def household_show(self, interaction: discord.Interaction):
+        await interaction.response.defer(ephemeral=True)
+        group = await self.service.get_user_group(interaction.user.id)
+        if not group:
+            emb = self._embed(title="Groupe", description="Vous ne faites partie d'aucun groupe.")
+            await interaction.followup.send(embed=emb, ephemeral=True)
+            return
+        totals = await self.service.group_totals(group.id)
+        members = await self.service.list_group_members(group.id)
+        lines = [f"Membres: {', '.join(f'<@{m}>' for m in members)}",
+                 f"Solde cumulé: {format_cents(totals.balance_cents)}",
+                 f"Total restant ce mois: {format_cents(totals.remaining_cents)}"]
+        emb = self._embed(title=f"Groupe {group.name} (#{group.id})", description="\n".join(lines))
+        await interaction.followup.send(embed=emb, ephemeral=True)
+
+    @group_household.command(name="leave", description="Quitter votre groupe")
+    async def household_leave(self, interaction: discord.Interaction):
+        await interaction.response.defer(ephemeral=True)
+        await self.service.leave_group(interaction.user.id)
+        emb = self._embed(title="Groupe quitté", description="Vous ne faites plus partie d'un groupe.",
+                          color=self.SUCCESS_COLOR)
+        await interaction.followup.send(embed=emb, ephemeral=True)
+
     @tasks.loop(minutes=1)
     async def reminder_task(self):
         now = datetime.now()
@@ -285,40 +450,59 @@ class Budget(commands.Cog):
                 pass
         if now.minute != 0 or now.hour != 8:
             return
-        prefs = await self.service.list_reminder_prefs()
-        if prefs:
-            for user_id, mode, channel_id in prefs:
+        try:
+            digests, has_prefs = await self.service.pending_digests()
+        except Exception:
+            # Ne pas arrêter la boucle: les prélèvements de 00:05 doivent continuer les jours suivants.
+            logger.exception("Failed to evaluate reminder digests")
+            return
+        if has_prefs:
+            sent = []
+            for d in digests:
                 try:
-                    total, subs_due, mans = await self.service.remaining_for_month(user_id)
                     lines = ["Rappel budget:"]
-                    if subs_due:
+                    if d.subs_due:
                         lines.append("- Abonnements à venir:")
-                        for name, cents, dom in subs_due:
+                        for name, cents, dom in d.subs_due:
                             lines.append(f"  • {name} le {dom}: {format_cents(cents)}")
-                    if mans:
+                    if d.expenses_due:
                         lines.append("- Dépenses à payer:")
-                        for name, cents, due in mans:
+                        for name, cents, due in d.expenses_due:
                             lines.append(f"  • {name} pour le {due}: {format_cents(cents)}")
-                    lines.append(f"Total restant ce mois: {format_cents(total)}")
+                    lines.append(f"Total restant ce mois: {format_cents(d.total)}")
+                    if d.group:
+                        name, remaining, members = d.group
+                        lines.append(f"Total restant du groupe {name} ({members} membres): {format_cents(remaining)}")
                     msg = "\n".join(lines)
-                    if mode == 'dm':
-                        user = self.bot.get_user(int(user_id)) or await self.bot.fetch_user(int(user_id))
-                        if user:
-                            await user.send(msg)
-                    elif mode == 'channel' and channel_id:
-                        ch = self.bot.get_channel(int(channel_id))
-                        if isinstance(ch, (discord.TextChannel, discord.Thread)):
-                            await ch.send(f"<@{user_id}>\n" + msg)
+                    if d.mode == 'dm':
+                        target = await self._dm_target(int(d.user_id))
+                        if target:
+                            await target.send(msg)
+                            sent.append((d.user_id, d.digest_hash))
+                    elif d.mode == 'channel' and d.channel_id:
+                        ch = self._channel_target(int(d.channel_id))
+                        if ch:
+                            await ch.send(f"<@{d.user_id}>\n" + msg)
+                            sent.append((d.user_id, d.digest_hash))
                 except Exception:
                     continue
+            try:
+                await self.service.mark_digests_sent(sent)
+            except Exception:
+                logger.exception("Failed to record sent reminder digests")
             return
         if not self.morning_channel_id:
             return
-        channel = self.bot.get_channel(self.morning_channel_id)
-        if not isinstance(channel, (discord.TextChannel, discord.Thread)):
+        channel = self._channel_target(self.morning_channel_id)
+        if not channel:
             return
-        await channel.send(
-            "Rappel budget: utilisez /reste pour voir ce qu'il reste à payer, /sub list et /pay list pour les détails.")
+        try:
+            await channel.send(
+                "Rappel budget: utilisez /reste pour voir ce qu'il reste à payer, /sub list et /pay list pour les "
+                "détails.")
+        except Exception:
+            # Salon supprimé ou inaccessible (NotFound/Forbidden en mode basse mémoire): ne pas arrêter la boucle.
+            logger.exception("Failed to send generic reminder to channel %s", self.morning_channel_id)
 
     @reminder_task.before_loop
     async def before_reminder(self):
@@ -332,3 +516,4 @@ async def setup(bot):
     bot.tree.add_command(cog.group_pay)
     bot.tree.add_command(cog.group_bank)
     bot.tree.add_command(cog.group_reminder)
+    bot.tree.add_command(cog.group_household)
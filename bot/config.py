@@ -1,8 +1,10 @@
 import os
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 from dotenv import load_dotenv
 
+from .db import PRAGMA_NAMES
+
 load_dotenv()
 
 
@@ -12,6 +14,16 @@ class Config:
     prefix: str = "!"
     database: str = "bot.db"
     reminder_channel_id: str | None = None
+    low_memory: bool = False
+    db_profile: str = "durable"
+    db_pragmas: dict[str, str] = field(default_factory=dict)
+
+
+def _env_bool(name: str, default: bool = False) -> bool:
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
 
 
 def get_config() -> Config:
@@ -19,7 +31,12 @@ def get_config() -> Config:
     prefix = os.getenv("COMMAND_PREFIX", "!")
     database = os.getenv("DATABASE_PATH", "bot.db")
     reminder_channel_id = os.getenv("REMINDER_CHANNEL_ID")
+    low_memory = _env_bool("LOW_MEMORY_MODE")
+    db_profile = os.getenv("SQLITE_PROFILE", "durable").strip().lower() or "durable"
+    db_pragmas = {name: os.environ[f"SQLITE_{name.upper()}"] for name in PRAGMA_NAMES
+                  if os.getenv(f"SQLITE_{name.upper()}", "").strip()}
     if not token:
         raise RuntimeError(
             "DISCORD_TOKEN is not set. Create a .env file with DISCORD_TOKEN=... or set the environment variable.")
-    return Config(token=token, prefix=prefix, database=database, reminder_channel_id=reminder_channel_id)
+    return Config(token=token, prefix=prefix, database=database, reminder_channel_id=reminder_channel_id,
+                  low_memory=low_memory, db_profile=db_profile, db_pragmas=db_pragmas)
@@ -1,3 +1,4 @@
+import re
 from typing import Optional
 
 import aiosqlite
@@ -6,16 +7,71 @@ INIT_SQL = """
 -- Budget-related tables are created by the budget cog on_ready via executescript.
 """
 
+# Pragmas réglables par profil ou individuellement (SQLITE_<NOM> dans l'environnement).
+PRAGMA_NAMES = ("synchronous", "cache_size", "mmap_size", "temp_store", "busy_timeout", "wal_autocheckpoint")
+
+# - durable: fsync à chaque commit (comportement historique), valeurs SQLite par défaut.
+# - balanced: synchronous=NORMAL, sûr en WAL face à un crash applicatif; seul un crash OS peut perdre
+#   les derniers commits. Cache et mmap plus grands.
+# - throughput: aucun fsync; un crash OS ou une coupure de courant peut perdre ou corrompre des données.
+PROFILES: dict[str, dict[str, str]] = {
+    "durable": {
+        "synchronous": "FULL",
+        "cache_size": "-2000",
+        "mmap_size": "0",
+        "temp_store": "DEFAULT",
+        "busy_timeout": "5000",
+        "wal_autocheckpoint": "1000",
+    },
+    "balanced": {
+        "synchronous": "NORMAL",
+        "cache_size": "-16000",
+        "mmap_size": "67108864",
+        "temp_store": "MEMORY",
+        "busy_timeout": "5000",
+        "wal_autocheckpoint": "1000",
+    },
+    "throughput": {
+        "synchronous": "OFF",
+        "cache_size": "-65536",
+        "mmap_size": "268435456",
+        "temp_store": "MEMORY",
+        "busy_timeout": "10000",
+        "wal_autocheckpoint": "4000",
+    },
+}
+
+_PRAGMA_VALUE_RE = re.compile(r"^-?\w+$")
+
+
+def resolve_pragmas(profile: str, overrides: Optional[dict[str, str]] = None) -> dict[str, str]:
+    """Retourne les pragmas du profil `profile`, complétés/écrasés par `overrides`."""
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown SQLite profile {profile!r}, expected one of {', '.join(PROFILES)}")
+    pragmas = dict(PROFILES[profile])
+    for name, value in (overrides or {}).items():
+        name = name.lower()
+        value = str(value).strip()
+        if name not in PRAGMA_NAMES:
+            raise ValueError(f"Unsupported pragma {name!r}, expected one of {', '.join(PRAGMA_NAMES)}")
+        if not _PRAGMA_VALUE_RE.match(value):
+            raise ValueError(f"Invalid value {value!r} for pragma {name}")
+        pragmas[name] = value
+    return pragmas
+
 
 class Database:
-    def __init__(self, path: str):
+    def __init__(self, path: str, profile: str = "durable", pragmas: Optional[dict[str, str]] = None):
         self.path = path
+        self.pragmas = resolve_pragmas(profile, pragmas)
         self._conn: Optional[aiosqlite.Connection] = None
 
     async def connect(self):
         self._conn = await aiosqlite.connect(self.path)
         await self._conn.execute("PRAGMA journal_mode=WAL")
         await self._conn.execute("PRAGMA foreign_keys=ON")
+        for name, value in self.pragmas.items():
+            await self._conn.execute(f"PRAGMA {name}={value}")
         await self._conn.execute(INIT_SQL)
         await self._conn.commit()
 
@@ -1,11 +1,19 @@
 from __future__ import annotations
 
+import hashlib
+import json
+import logging
+import secrets
 from dataclasses import dataclass
-from datetime import date
+from datetime import date, timedelta
 from typing import Iterable, Optional, Tuple
 
 import aiosqlite
 
+from .recurrence import RecurrenceRule, month_end, occurrences
+
+logger = logging.getLogger(__name__)
+
 SCHEMA_SQL = """
              CREATE TABLE IF NOT EXISTS subscriptions
              (
@@ -112,6 +120,66 @@ SCHEMA_SQL = """
                  ); \
              """
 
+# Colonnes de règle de récurrence ajoutées après coup à `subscriptions` (ALTER TABLE sur les bases existantes).
+# Les lignes historiques gardent les valeurs par défaut, soit "le `day_of_month` de chaque mois".
+SUBSCRIPTION_RULE_COLUMNS = (
+    ("frequency", "TEXT NOT NULL DEFAULT 'monthly'"),
+    ("interval", "INTEGER NOT NULL DEFAULT 1"),
+    ("anchor_date", "DATE"),
+    ("last_day", "INTEGER NOT NULL DEFAULT 0"),
+)
+
+# Options de rappel ajoutées à `user_reminders`: `quiet` n'envoie le rappel que s'il a changé depuis le dernier envoi
+# ou si une échéance tombe dans les `lookahead_days` prochains jours.
+REMINDER_COLUMNS = (
+    ("quiet", "INTEGER NOT NULL DEFAULT 0"),
+    ("lookahead_days", "INTEGER NOT NULL DEFAULT 3"),
+)
+
+# État du dernier rappel calculé par utilisateur. `dirty` est positionné par les écritures de BudgetService et
+# quand `valid_through` est dépassé (une échéance est passée ou le mois a changé).
+DIGEST_SQL = """
+CREATE TABLE IF NOT EXISTS digest_state
+(
+    user_id       TEXT PRIMARY KEY,
+    dirty         INTEGER NOT NULL DEFAULT 1,
+    payload       TEXT,
+    digest_hash   TEXT,
+    sent_hash     TEXT,
+    next_due      DATE,
+    valid_through DATE
+);
+"""
+
+# Budgets partagés: un utilisateur appartient au plus à un groupe (foyer). Les index couvrent les jointures
+# membre -> données utilisées par les totaux agrégés du groupe.
+GROUP_SQL = """
+CREATE TABLE IF NOT EXISTS budget_groups
+(
+    id         INTEGER PRIMARY KEY AUTOINCREMENT,
+    name       TEXT NOT NULL,
+    owner_id   TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS group_members
+(
+    user_id  TEXT PRIMARY KEY,
+    group_id INTEGER NOT NULL REFERENCES budget_groups (id) ON DELETE CASCADE
+);
+
+CREATE INDEX IF NOT EXISTS idx_group_members_group ON group_members (group_id, user_id);
+CREATE INDEX IF NOT EXISTS idx_subscriptions_user ON subscriptions (user_id, active);
+CREATE INDEX IF NOT EXISTS idx_manual_expenses_user ON manual_expenses (user_id, paid, due_date);
+"""
+
+# Code d'invitation aléatoire exigé par /group join; seul le propriétaire peut le consulter ou le régénérer.
+GROUP_COLUMNS = (
+    ("invite_code", "TEXT"),
+)
+
+SUBSCRIPTION_COLUMNS = "id, user_id, name, amount_cents, day_of_month, active, frequency, interval, anchor_date, last_day"
+
 
 @dataclass(frozen=True)
 class Subscription:
@@ -121,6 +189,25 @@ class Subscription:
     amount_cents: int
     day_of_month: int
     active: int
+    frequency: str = "monthly"
+    interval: int = 1
+    anchor_date: Optional[str] = None
+    last_day: int = 0
+
+    @property
+    def rule(self) -> RecurrenceRule:
+        return _rule_from_row(self.frequency, self.interval, self.day_of_month, self.anchor_date, self.last_day)
+
+
+def _rule_from_row(frequency: str, interval: int, day_of_month: int, anchor_date: Optional[str],
+                   last_day: int) -> RecurrenceRule:
+    return RecurrenceRule(
+        frequency=frequency,
+        interval=int(interval),
+        day_of_month=int(day_of_month),
+        anchor=date.fromisoformat(anchor_date) if anchor_date else None,
+        last_day=bool(last_day),
+    )
 
 
 @dataclass(frozen=True)
@@ -133,10 +220,44 @@ class Expense:
     paid: int
 
 
+@dataclass(frozen=True)
+class BudgetGroup:
+    id: int
+    name: str
+    owner_id: str
+    invite_code: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class GroupTotals:
+    group: BudgetGroup
+    members: int
+    balance_cents: int
+    remaining_cents: int
+    next_due: Optional[str]
+
+
+@dataclass(frozen=True)
+class Digest:
+    """Rappel quotidien d'un utilisateur, relu depuis le contenu mis en cache par `pending_digests`:
+    totaux du mois de l'utilisateur et, s'il fait partie d'un groupe, `group` = (nom, reste à payer, membres).
+    """
+    user_id: str
+    mode: str
+    channel_id: Optional[str]
+    total: int
+    subs_due: list
+    expenses_due: list
+    digest_hash: str
+    group: Optional[list] = None
+
+
 class BudgetService:
     def __init__(self, conn: aiosqlite.Connection):
         self.conn = conn
         self._last_subscription_charge_date: Optional[str] = None
+        # group_id -> (date ISO du calcul, totaux); invalidé par _mark_dirty
+        self._group_totals: dict[int, tuple[str, GroupTotals]] = {}
 
     async def ensure_schema(self) -> None:
         await self.conn.executescript(SCHEMA_SQL)
@@ -145,28 +266,67 @@ class BudgetService:
         await self.conn.execute(
             "CREATE TABLE IF NOT EXISTS subscription_charges (user_id TEXT PRIMARY KEY, last_charge_date DATE NOT NULL)"
         )
+        await self._ensure_columns("subscriptions", SUBSCRIPTION_RULE_COLUMNS)
+        await self._ensure_columns("user_reminders", REMINDER_COLUMNS)
+        await self.conn.executescript(DIGEST_SQL)
+        await self.conn.executescript(GROUP_SQL)
+        await self._ensure_columns("budget_groups", GROUP_COLUMNS)
+        await self.conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_budget_groups_invite ON budget_groups (invite_code)"
+        )
         await self.conn.commit()
 
-    async def set_reminder_pref(self, user_id: int | str, mode: str, channel_id: int | str | None = None) -> None:
+    async def _ensure_columns(self, table: str, columns: tuple[tuple[str, str], ...]) -> None:
+        async with self.conn.execute(f"PRAGMA table_info({table})") as cur:
+            existing = {row[1] for row in await cur.fetchall()}
+        for column, ddl in columns:
+            if column not in existing:
+                await self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+
+    async def _mark_dirty(self, user_id: int | str) -> None:
+        """Marque le rappel de l'utilisateur à recalculer, ainsi que les totaux et rappels de son groupe.
+        Le commit est laissé à l'appelant.
+        """
+        await self.conn.execute(
+            "INSERT INTO digest_state(user_id, dirty) VALUES (?, 1) ON CONFLICT(user_id) DO UPDATE SET dirty=1",
+            (str(user_id),),
+        )
+        async with self.conn.execute("SELECT group_id FROM group_members WHERE user_id=?", (str(user_id),)) as cur:
+            row = await cur.fetchone()
+        if row:
+            await self._invalidate_group(int(row[0]))
+
+    async def _invalidate_group(self, group_id: int) -> None:
+        self._group_totals.pop(group_id, None)
+        await self.conn.execute(
+            "UPDATE digest_state SET dirty=1 WHERE user_id IN (SELECT user_id FROM group_members WHERE group_id=?)",
+            (group_id,),
+        )
+
+    async def set_reminder_pref(self, user_id: int | str, mode: str, channel_id: int | str | None = None,
+                                quiet: bool = False, lookahead_days: int = 3) -> None:
         mode = mode.lower()
         if mode not in ("dm", "channel"):
             raise ValueError("mode must be 'dm' or 'channel'")
+        if lookahead_days < 0:
+            raise ValueError("lookahead_days must be >= 0")
         chan = str(channel_id) if channel_id is not None else None
         await self.conn.execute(
-            "INSERT INTO user_reminders(user_id, mode, channel_id) VALUES (?,?,?) ON CONFLICT(user_id) DO UPDATE SET mode=excluded.mode, channel_id=excluded.channel_id",
-            (str(user_id), mode, chan),
+            "INSERT INTO user_reminders(user_id, mode, channel_id, quiet, lookahead_days) VALUES (?,?,?,?,?) ON CONFLICT(user_id) DO UPDATE SET mode=excluded.mode, channel_id=excluded.channel_id, quiet=excluded.quiet, lookahead_days=excluded.lookahead_days",
+            (str(user_id), mode, chan, int(quiet), int(lookahead_days)),
         )
         await self.conn.commit()
 
-    async def get_reminder_pref(self, user_id: int | str) -> Optional[tuple[str, Optional[str]]]:
+    async def get_reminder_pref(self, user_id: int | str) -> Optional[tuple[str, Optional[str], bool, int]]:
+        """Retourne (mode, channel_id, quiet, lookahead_days) ou None."""
         async with self.conn.execute(
-                "SELECT mode, channel_id FROM user_reminders WHERE user_id=?",
+                "SELECT mode, channel_id, quiet, lookahead_days FROM user_reminders WHERE user_id=?",
                 (str(user_id),),
         ) as cur:
             row = await cur.fetchone()
         if not row:
             return None
-        return row[0], row[1]
+        return row[0], row[1], bool(row[2]), int(row[3])
 
     async def list_reminder_prefs(self) -> list[tuple[str, str, Optional[str]]]:
         async with self.conn.execute(
@@ -175,16 +335,24 @@ class BudgetService:
             rows = await cur.fetchall()
         return [(str(r[0]), str(r[1]), (str(r[2]) if r[2] is not None else None)) for r in rows]
 
-    async def add_subscription(self, user_id: int | str, name: str, amount_cents: int, day_of_month: int) -> None:
+    async def add_subscription(self, user_id: int | str, name: str, amount_cents: int, day_of_month: int,
+                               rule: Optional[RecurrenceRule] = None) -> None:
+        """Ajoute un abonnement. Sans `rule`, l'abonnement est prélevé le `day_of_month` de chaque mois.
+        Pour les autres règles, `day_of_month` ne sert qu'au tri (1..28).
+        """
+        if rule is None:
+            rule = RecurrenceRule(day_of_month=int(day_of_month))
         await self.conn.execute(
-            "INSERT INTO subscriptions (user_id, name, amount_cents, day_of_month) VALUES (?,?,?,?)",
-            (str(user_id), name, amount_cents, int(day_of_month)),
+            "INSERT INTO subscriptions (user_id, name, amount_cents, day_of_month, frequency, interval, anchor_date, last_day) VALUES (?,?,?,?,?,?,?,?)",
+            (str(user_id), name, amount_cents, int(day_of_month), rule.frequency, rule.interval,
+             rule.anchor.isoformat() if rule.anchor else None, int(rule.last_day)),
         )
+        await self._mark_dirty(user_id)
         await self.conn.commit()
 
     async def list_subscriptions(self, user_id: int | str) -> Iterable[Subscription]:
         async with self.conn.execute(
-                "SELECT id, user_id, name, amount_cents, day_of_month, active FROM subscriptions WHERE user_id=? ORDER BY day_of_month, name",
+                f"SELECT {SUBSCRIPTION_COLUMNS} FROM subscriptions WHERE user_id=? ORDER BY day_of_month, name",
                 (str(user_id),),
         ) as cur:
             rows = await cur.fetchall()
@@ -192,6 +360,7 @@ class BudgetService:
 
     async def delete_subscription(self, user_id: int | str, sub_id: int) -> None:
         await self.conn.execute("DELETE FROM subscriptions WHERE id=? AND user_id=?", (sub_id, str(user_id)))
+        await self._mark_dirty(user_id)
         await self.conn.commit()
 
     async def add_expense(self, user_id: int | str, name: str, amount_cents: int, due_date: str) -> None:
@@ -199,6 +368,7 @@ class BudgetService:
             "INSERT INTO manual_expenses (user_id, name, amount_cents, due_date) VALUES (?,?,?,?)",
             (str(user_id), name, amount_cents, due_date),
         )
+        await self._mark_dirty(user_id)
         await self.conn.commit()
 
     async def list_unpaid_expenses(self, user_id: int | str) -> Iterable[Expense]:
@@ -214,6 +384,7 @@ class BudgetService:
             "UPDATE manual_expenses SET paid=1 WHERE id=? AND user_id=?",
             (expense_id, str(user_id)),
         )
+        await self._mark_dirty(user_id)
         await self.conn.commit()
 
     async def delete_expense(self, user_id: int | str, expense_id: int) -> None:
@@ -221,6 +392,7 @@ class BudgetService:
             "DELETE FROM manual_expenses WHERE id=? AND user_id=?",
             (expense_id, str(user_id)),
         )
+        await self._mark_dirty(user_id)
         await self.conn.commit()
 
     async def get_balance(self, user_id: int | str) -> int:
@@ -236,6 +408,7 @@ class BudgetService:
             "INSERT INTO balances(user_id, balance_cents) VALUES (?, ?) ON CONFLICT(user_id) DO UPDATE SET balance_cents=excluded.balance_cents",
             (str(user_id), cents),
         )
+        await self._mark_dirty(user_id)
         await self.conn.commit()
 
     async def add_to_balance(self, user_id: int | str, delta_cents: int) -> int:
@@ -243,6 +416,7 @@ class BudgetService:
             "INSERT INTO balances(user_id, balance_cents) VALUES (?, ?) ON CONFLICT(user_id) DO UPDATE SET balance_cents=balance_cents+?",
             (str(user_id), delta_cents, delta_cents),
         )
+        await self._mark_dirty(user_id)
         await self.conn.commit()
         return await self.get_balance(user_id)
 
@@ -251,6 +425,7 @@ class BudgetService:
             "INSERT INTO balances(user_id, balance_cents) VALUES (?, 0) ON CONFLICT(user_id) DO UPDATE SET balance_cents=balance_cents-?",
             (str(user_id), delta_cents),
         )
+        await self._mark_dirty(user_id)
         await self.conn.commit()
         return await self.get_balance(user_id)
 
@@ -260,17 +435,26 @@ class BudgetService:
         """
         from datetime import datetime, timezone
         today = datetime.now(timezone.utc).date()
-        # For each user with active subscriptions due today, sum amounts and subtract from balance once a day.
+        # Plain monthly subscriptions (the common case) are filtered on day_of_month in SQL;
+        # only the other recurrence rules are expanded in Python.
         async with self.conn.execute(
-            "SELECT user_id, SUM(amount_cents) FROM subscriptions WHERE active=1 AND day_of_month=? GROUP BY user_id",
-            (int(today.day),),
+            "SELECT user_id, SUM(amount_cents) FROM subscriptions WHERE active=1 AND frequency='monthly' AND interval=1 AND last_day=0 AND day_of_month=? AND (anchor_date IS NULL OR anchor_date<=?) GROUP BY user_id",
+            (int(today.day), today.isoformat()),
         ) as cur:
-            rows = await cur.fetchall()
-        for user_id, total_cents in rows:
+            totals: dict[str, int] = {str(user_id): int(cents or 0) for user_id, cents in await cur.fetchall()}
+        async with self.conn.execute(
+            "SELECT user_id, amount_cents, frequency, interval, day_of_month, anchor_date, last_day FROM subscriptions WHERE active=1 AND NOT (frequency='monthly' AND interval=1 AND last_day=0)",
+        ) as cur:
+            subs = await cur.fetchall()
+        for user_id, cents, frequency, interval, dom, anchor_date, last_day in subs:
+            rule = _rule_from_row(frequency, interval, dom, anchor_date, last_day)
+            if next(occurrences(rule, today, today), None) is not None:
+                totals[str(user_id)] = totals.get(str(user_id), 0) + int(cents)
+        for user_id, total_cents in totals.items():
             # check if already charged today
             async with self.conn.execute(
                 "SELECT last_charge_date FROM subscription_charges WHERE user_id=?",
-                (str(user_id),),
+                (user_id,),
             ) as c2:
                 row = await c2.fetchone()
             if row and row[0] == today.isoformat():
@@ -278,30 +462,37 @@ class BudgetService:
             # subtract
             await self.conn.execute(
                 "INSERT INTO balances(user_id, balance_cents) VALUES (?, 0) ON CONFLICT(user_id) DO UPDATE SET balance_cents=balance_cents-?",
-                (str(user_id), int(total_cents) if total_cents is not None else 0),
+                (user_id, total_cents),
             )
             # upsert last charge date
             await self.conn.execute(
                 "INSERT INTO subscription_charges(user_id, last_charge_date) VALUES (?, ?) ON CONFLICT(user_id) DO UPDATE SET last_charge_date=excluded.last_charge_date",
-                (str(user_id), today.isoformat()),
+                (user_id, today.isoformat()),
             )
+            await self._mark_dirty(user_id)
         await self.conn.commit()
 
     async def remaining_for_month(self, user_id: int | str, today: Optional[date] = None) -> Tuple[
         int, list[tuple[str, int, int]], list[tuple[str, int, str]]]:
         """Retourne (total_cents, subs_due, expenses_due)
-        subs_due: liste de (name, amount_cents, day_of_month)
+        subs_due: liste de (name, amount_cents, day_of_month), une entrée par occurrence restante du mois
         expenses_due: liste de (name, amount_cents, due_date)
         """
         from datetime import datetime, timezone
         if today is None:
             today = datetime.now(timezone.utc).date()
         async with self.conn.execute(
-                "SELECT name, amount_cents, day_of_month FROM subscriptions WHERE user_id=? AND active=1",
+                "SELECT name, amount_cents, frequency, interval, day_of_month, anchor_date, last_day FROM subscriptions WHERE user_id=? AND active=1",
                 (str(user_id),),
         ) as cur:
             subs = await cur.fetchall()
-        subs_due = [(name, cents, dom) for (name, cents, dom) in subs if int(dom) >= int(today.day)]
+        end = month_end(today)
+        subs_due = sorted(
+            ((name, cents, occ.day)
+             for (name, cents, frequency, interval, dom, anchor_date, last_day) in subs
+             for occ in occurrences(_rule_from_row(frequency, interval, dom, anchor_date, last_day), today, end)),
+            key=lambda s: (s[2], s[0]),
+        )
         subs_total = sum(c for _, c, _ in subs_due)
         async with self.conn.execute(
                 "SELECT name, amount_cents, due_date FROM manual_expenses WHERE user_id=? AND paid=0 AND due_date>=? AND substr(due_date,1,7)=?",
@@ -311,3 +502,230 @@ class BudgetService:
         man_total = sum(r[1] for r in mans)
         total = subs_total + man_total
         return total, subs_due, mans
+
+    async def pending_digests(self, today: Optional[date] = None) -> tuple[list[Digest], bool]:
+        """Retourne (rappels à envoyer aujourd'hui, au moins une préférence de rappel existe).
+
+        Seuls les utilisateurs marqués `dirty` (écriture ou échéance passée depuis le dernier calcul) sont
+        recalculés; les autres réutilisent le rappel stocké. En mode `quiet`, un rappel n'est retourné que
+        s'il diffère du dernier envoyé ou si une échéance tombe dans les `lookahead_days` prochains jours.
+        Un utilisateur dont le calcul échoue est ignoré et reste `dirty` pour le prochain passage.
+        """
+        from datetime import datetime, timezone
+        if today is None:
+            today = datetime.now(timezone.utc).date()
+        await self.conn.execute(
+            "UPDATE digest_state SET dirty=1 WHERE dirty=0 AND (valid_through IS NULL OR valid_through < ?)",
+            (today.isoformat(),),
+        )
+        async with self.conn.execute(
+                "SELECT r.user_id, r.mode, r.channel_id, r.quiet, r.lookahead_days, d.dirty, d.payload, d.digest_hash, d.sent_hash, d.next_due, gm.group_id FROM user_reminders r LEFT JOIN digest_state d ON d.user_id=r.user_id LEFT JOIN group_members gm ON gm.user_id=r.user_id",
+        ) as cur:
+            rows = await cur.fetchall()
+        digests = []
+        for row in rows:
+            try:
+                digest = await self._evaluate_digest(today, *row)
+            except Exception:
+                logger.exception("Failed to evaluate reminder digest for user %s", row[0])
+                continue
+            if digest is not None:
+                digests.append(digest)
+        await self.conn.commit()
+        return digests, bool(rows)
+
+    async def _evaluate_digest(self, today: date, user_id, mode, channel_id, quiet, lookahead_days, dirty, payload,
+                               digest_hash, sent_hash, next_due, group_id) -> Optional[Digest]:
+        if dirty is None or dirty or payload is None:
+            total, subs_due, mans = await self.remaining_for_month(user_id, today)
+            totals = await self.group_totals(group_id, today) if group_id is not None else None
+            group = [totals.group.name, totals.remaining_cents, totals.members] if totals else None
+            payload = json.dumps([total, subs_due, mans, group])
+            digest_hash = hashlib.sha256(payload.encode()).hexdigest()
+            due_dates = [date(today.year, today.month, int(dom)).isoformat() for _, _, dom in subs_due]
+            due_dates += [str(due) for _, _, due in mans]
+            if totals and totals.next_due:
+                due_dates.append(totals.next_due)
+            next_due = min(due_dates) if due_dates else None
+            valid_through = min(next_due or "9999-12-31", month_end(today).isoformat())
+            await self.conn.execute(
+                "INSERT INTO digest_state(user_id, dirty, payload, digest_hash, next_due, valid_through) VALUES (?, 0, ?, ?, ?, ?) ON CONFLICT(user_id) DO UPDATE SET dirty=0, payload=excluded.payload, digest_hash=excluded.digest_hash, next_due=excluded.next_due, valid_through=excluded.valid_through",
+                (str(user_id), payload, digest_hash, next_due, valid_through),
+            )
+        if quiet and digest_hash == sent_hash and not (
+                next_due and next_due <= (today + timedelta(days=int(lookahead_days))).isoformat()):
+            return None
+        total, subs_due, mans, group = json.loads(payload)
+        return Digest(str(user_id), str(mode), str(channel_id) if channel_id is not None else None,
+                      int(total), subs_due, mans, digest_hash, group)
+
+    async def mark_digests_sent(self, sent: list[tuple[str, str]]) -> None:
+        """Enregistre le hash du rappel envoyé pour chaque (user_id, digest_hash)."""
+        if not sent:
+            return
+        await self.conn.executemany(
+            "UPDATE digest_state SET sent_hash=? WHERE user_id=?",
+            [(digest_hash, str(user_id)) for user_id, digest_hash in sent],
+        )
+        await self.conn.commit()
+
+    async def create_group(self, user_id: int | str, name: str) -> BudgetGroup:
+        """Crée un groupe dont l'utilisateur devient propriétaire et membre (il quitte son groupe actuel)."""
+        invite_code = secrets.token_urlsafe(8)
+        async with self.conn.execute(
+                "INSERT INTO budget_groups(name, owner_id, invite_code) VALUES (?, ?, ?)",
+                (name, str(user_id), invite_code),
+        ) as cur:
+            group_id = int(cur.lastrowid)
+        await self._set_membership(user_id, group_id)
+        await self.conn.commit()
+        return BudgetGroup(group_id, name, str(user_id), invite_code)
+
+    async def join_group(self, user_id: int | str, invite_code: str) -> Optional[BudgetGroup]:
+        """Rejoint le groupe correspondant au code d'invitation (en quittant le groupe actuel).
+        Retourne None si le code ne correspond à aucun groupe.
+        """
+        invite_code = invite_code.strip()
+        if not invite_code:
+            return None
+        async with self.conn.execute(
+                "SELECT id, name, owner_id, invite_code FROM budget_groups WHERE invite_code=?",
+                (invite_code,),
+        ) as cur:
+            row = await cur.fetchone()
+        if not row:
+            return None
+        group = BudgetGroup(int(row[0]), row[1], str(row[2]), row[3])
+        await self._set_membership(user_id, group.id)
+        await self.conn.commit()
+        return group
+
+    async def regenerate_invite(self, user_id: int | str) -> Optional[BudgetGroup]:
+        """Génère un nouveau code pour le groupe de l'utilisateur, l'ancien devenant invalide.
+        Retourne None si l'utilisateur n'est pas propriétaire de son groupe.
+        """
+        group = await self.get_user_group(user_id)
+        if group is None or group.owner_id != str(user_id):
+            return None
+        invite_code = secrets.token_urlsafe(8)
+        await self.conn.execute("UPDATE budget_groups SET invite_code=? WHERE id=?", (invite_code, group.id))
+        await self.conn.commit()
+        return BudgetGroup(group.id, group.name, group.owner_id, invite_code)
+
+    async def leave_group(self, user_id: int | str) -> None:
+        await self._detach_from_group(user_id)
+        await self.conn.commit()
+
+    async def _set_membership(self, user_id: int | str, group_id: int) -> None:
+        current = await self.get_user_group(user_id)
+        if current is not None and current.id == group_id:
+            return
+        # Quitte (et invalide) l'ancien groupe avant le changement, invalide le nouveau après.
+        await self._detach_from_group(user_id)
+        await self.conn.execute(
+            "INSERT INTO group_members(user_id, group_id) VALUES (?, ?)",
+            (str(user_id), group_id),
+        )
+        await self._invalidate_group(group_id)
+
+    async def _detach_from_group(self, user_id: int | str) -> None:
+        """Retire l'utilisateur de son groupe. Si c'était le propriétaire, la propriété passe au plus ancien membre
+        restant et le code d'invitation est révoqué; un groupe sans membre est supprimé. Le commit est laissé à
+        l'appelant.
+        """
+        async with self.conn.execute(
+                "SELECT g.id, g.owner_id FROM group_members gm JOIN budget_groups g ON g.id=gm.group_id WHERE gm.user_id=?",
+                (str(user_id),),
+        ) as cur:
+            row = await cur.fetchone()
+        await self._mark_dirty(user_id)
+        if not row:
+            return
+        group_id, owner_id = int(row[0]), str(row[1])
+        await self.conn.execute("DELETE FROM group_members WHERE user_id=?", (str(user_id),))
+        async with self.conn.execute(
+                "SELECT user_id FROM group_members WHERE group_id=? ORDER BY rowid LIMIT 1",
+                (group_id,),
+        ) as cur:
+            successor = await cur.fetchone()
+        if successor is None:
+            await self.conn.execute("DELETE FROM budget_groups WHERE id=?", (group_id,))
+            self._group_totals.pop(group_id, None)
+        elif owner_id == str(user_id):
+            await self.conn.execute(
+                "UPDATE budget_groups SET owner_id=?, invite_code=NULL WHERE id=?",
+                (str(successor[0]), group_id),
+            )
+
+    async def get_group(self, group_id: int) -> Optional[BudgetGroup]:
+        async with self.conn.execute(
+                "SELECT id, name, owner_id, invite_code FROM budget_groups WHERE id=?",
+                (int(group_id),),
+        ) as cur:
+            row = await cur.fetchone()
+        return BudgetGroup(int(row[0]), row[1], str(row[2]), row[3]) if row else None
+
+    async def get_user_group(self, user_id: int | str) -> Optional[BudgetGroup]:
+        async with self.conn.execute(
+                "SELECT g.id, g.name, g.owner_id, g.invite_code FROM group_members gm JOIN budget_groups g ON g.id=gm.group_id WHERE gm.user_id=?",
+                (str(user_id),),
+        ) as cur:
+            row = await cur.fetchone()
+        return BudgetGroup(int(row[0]), row[1], str(row[2]), row[3]) if row else None
+
+    async def list_group_members(self, group_id: int) -> list[str]:
+        async with self.conn.execute(
+                "SELECT user_id FROM group_members WHERE group_id=? ORDER BY user_id",
+                (int(group_id),),
+        ) as cur:
+            rows = await cur.fetchall()
+        return [str(r[0]) for r in rows]
+
+    async def group_totals(self, group_id: int, today: Optional[date] = None) -> Optional[GroupTotals]:
+        """Solde et reste à payer ce mois cumulés sur tous les membres du groupe.
+
+        Les soldes et dépenses sont agrégés en une requête sur la jointure des membres, les abonnements en une
+        seconde (leurs règles de récurrence sont développées ensuite). Le résultat est mis en cache pour la
+        journée et invalidé par les écritures des membres.
+        """
+        from datetime import datetime, timezone
+        if today is None:
+            today = datetime.now(timezone.utc).date()
+        cached = self._group_totals.get(int(group_id))
+        if cached and cached[0] == today.isoformat():
+            return cached[1]
+        group = await self.get_group(group_id)
+        if group is None:
+            return None
+        end = month_end(today)
+        async with self.conn.execute(
+                """SELECT COUNT(*),
+                          COALESCE(SUM((SELECT b.balance_cents FROM balances b WHERE b.user_id = gm.user_id)), 0),
+                          (SELECT COALESCE(SUM(e.amount_cents), 0)
+                           FROM group_members m
+                                    JOIN manual_expenses e ON e.user_id = m.user_id
+                           WHERE m.group_id = ?1 AND e.paid = 0 AND e.due_date BETWEEN ?2 AND ?3),
+                          (SELECT MIN(e.due_date)
+                           FROM group_members m
+                                    JOIN manual_expenses e ON e.user_id = m.user_id
+                           WHERE m.group_id = ?1 AND e.paid = 0 AND e.due_date BETWEEN ?2 AND ?3)
+                   FROM group_members gm
+                   WHERE gm.group_id = ?1""",
+                (group.id, today.isoformat(), end.isoformat()),
+        ) as cur:
+            members, balance, expenses_total, next_expense = await cur.fetchone()
+        async with self.conn.execute(
+                "SELECT s.amount_cents, s.frequency, s.interval, s.day_of_month, s.anchor_date, s.last_day FROM group_members gm JOIN subscriptions s ON s.user_id=gm.user_id WHERE gm.group_id=? AND s.active=1",
+                (group.id,),
+        ) as cur:
+            subs = await cur.fetchall()
+        subs_total = 0
+        next_due = next_expense
+        for cents, frequency, interval, dom, anchor_date, last_day in subs:
+            for occ in occurrences(_rule_from_row(frequency, interval, dom, anchor_date, last_day), today, end):
+                subs_total += int(cents)
+                if next_due is None or occ.isoformat() < next_due:
+                    next_due = occ.isoformat()
+        totals = GroupTotals(group, int(members), int(balance), subs_total + int(expenses_total), next_due)
+        self._group_totals[group.id] = (today.isoformat(), totals)
+        return totals
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import calendar
+from dataclasses import dataclass
+from datetime import date, timedelta
+from functools import lru_cache
+from typing import Iterator, Optional
+
+FREQUENCIES = ("weekly", "monthly", "yearly")
+
+WEEKDAYS_FR = ("lundi", "mardi", "mercredi", "jeudi", "vendredi", "samedi", "dimanche")
+
+
+@dataclass(frozen=True)
+class RecurrenceRule:
+    """Règle de récurrence d'un abonnement.
+
+    - monthly: le `day_of_month` (ou le dernier jour si `last_day`) tous les `interval` mois,
+      la phase étant donnée par le mois de `anchor` quand `interval` > 1.
+    - weekly: le même jour de semaine que `anchor`, toutes les `interval` semaines.
+    - yearly: le même jour/mois que `anchor` (ou le dernier jour du mois si `last_day`), tous les `interval` ans.
+    Aucune occurrence n'est générée avant `anchor`.
+    """
+    frequency: str = "monthly"
+    interval: int = 1
+    day_of_month: int = 1
+    anchor: Optional[date] = None
+    last_day: bool = False
+
+    def __post_init__(self):
+        if self.frequency not in FREQUENCIES:
+            raise ValueError(f"frequency must be one of {', '.join(FREQUENCIES)}")
+        if self.interval < 1:
+            raise ValueError("interval must be >= 1")
+        if self.frequency in ("weekly", "yearly") and self.anchor is None:
+            raise ValueError(f"a {self.frequency} rule requires an anchor date")
+        if self.frequency == "monthly" and self.interval > 1 and self.anchor is None:
+            raise ValueError("a monthly rule with interval > 1 requires an anchor date")
+
+    def describe(self) -> str:
+        """Description lisible (ex: "tous les 2 mois le 15", "chaque semaine le lundi")."""
+        if self.frequency == "weekly":
+            day = WEEKDAYS_FR[self.anchor.weekday()]
+            if self.interval == 1:
+                return f"chaque semaine le {day}"
+            return f"toutes les {self.interval} semaines le {day}"
+        if self.frequency == "yearly":
+            if self.last_day:
+                when = f"le dernier jour du mois {self.anchor.month:02d}"
+            else:
+                when = f"le {self.anchor.strftime('%d/%m')}"
+            if self.interval == 1:
+                return f"chaque année {when}"
+            return f"tous les {self.interval} ans {when}"
+        when = "le dernier jour" if self.last_day else f"le {self.day_of_month}"
+        if self.interval == 1:
+            return f"{when} de chaque mois"
+        return f"tous les {self.interval} mois {when}"
+
+
+def _month_length(year: int, month: int) -> int:
+    return calendar.monthrange(year, month)[1]
+
+
+@lru_cache(maxsize=4096)
+def _month_occurrences(rule: RecurrenceRule, year: int, month: int) -> tuple[date, ...]:
+    """Toutes les occurrences de `rule` dans le mois donné. Mis en cache par (règle, mois)."""
+    length = _month_length(year, month)
+    first = date(year, month, 1)
+    last = date(year, month, length)
+    anchor = rule.anchor
+    if anchor is not None and last < anchor:
+        return ()
+
+    if rule.frequency == "weekly":
+        start = max(first, anchor)
+        step = 7 * rule.interval
+        current = start + timedelta(days=(anchor - start).days % step)
+        found = []
+        while current <= last:
+            found.append(current)
+            current += timedelta(days=step)
+        return tuple(found)
+
+    if rule.frequency == "yearly":
+        if month != anchor.month or (year - anchor.year) % rule.interval:
+            return ()
+        day = length if rule.last_day else min(anchor.day, length)
+    else:
+        if anchor is not None and ((year - anchor.year) * 12 + month - anchor.month) % rule.interval:
+            return ()
+        day = length if rule.last_day else min(rule.day_of_month, length)
+
+    occurrence = date(year, month, day)
+    if anchor is not None and occurrence < anchor:
+        return ()
+    return (occurrence,)
+
+
+def occurrences(rule: RecurrenceRule, start: date, end: date) -> Iterator[date]:
+    """Génère paresseusement les occurrences de `rule` entre `start` et `end` inclus."""
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        for occurrence in _month_occurrences(rule, year, month):
+            if occurrence > end:
+                return
+            if occurrence >= start:
+                yield occurrence
+        month += 1
+        if month > 12:
+            year, month = year + 1, 1
+
+
+def month_end(day: date) -> date:
+    return date(day.year, day.month, _month_length(day.year, day.month))
@@ -0,0 +1,26 @@
+import asyncio
+
+import aiosqlite
+import pytest
+
+from bot.services.budget_service import BudgetService
+
+
+@pytest.fixture
+def with_service():
+    """Exécute `test(service)` sur une base SQLite en mémoire au schéma à jour."""
+
+    def run(test):
+        async def main():
+            conn = await aiosqlite.connect(":memory:")
+            await conn.execute("PRAGMA foreign_keys=ON")
+            try:
+                service = BudgetService(conn)
+                await service.ensure_schema()
+                await test(service)
+            finally:
+                await conn.close()
+
+        asyncio.run(main())
+
+    return run
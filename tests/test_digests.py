@@ -0,0 +1,149 @@
+from datetime import date
+
+import pytest
+
+TODAY = date(2026, 10, 10)
+
+
+async def _state(service, user_id):
+    async with service.conn.execute(
+            "SELECT dirty, valid_through, next_due FROM digest_state WHERE user_id=?", (str(user_id),),
+    ) as cur:
+        return await cur.fetchone()
+
+
+async def _sent(service, today):
+    digests, _ = await service.pending_digests(today)
+    await service.mark_digests_sent([(d.user_id, d.digest_hash) for d in digests])
+    return digests
+
+
+@pytest.mark.parametrize("write", [
+    lambda s: s.add_subscription(1, "Gym", 1000, 20),
+    lambda s: s.delete_subscription(1, 1),
+    lambda s: s.add_expense(1, "Eau", 3000, "2026-10-25"),
+    lambda s: s.mark_expense_paid(1, 1),
+    lambda s: s.delete_expense(1, 1),
+    lambda s: s.set_balance(1, 100),
+    lambda s: s.add_to_balance(1, 100),
+    lambda s: s.sub_from_balance(1, 100),
+])
+def test_writes_mark_user_dirty(with_service, write):
+    async def check(s):
+        await s.add_subscription(1, "Netflix", 1299, 15)
+        await s.add_expense(1, "Loyer", 80000, "2026-10-20")
+        await s.set_reminder_pref(1, "dm")
+        await s.pending_digests(TODAY)
+        assert (await _state(s, 1))[0] == 0
+        await write(s)
+        assert (await _state(s, 1))[0] == 1
+
+    with_service(check)
+
+
+def test_clean_users_reuse_stored_digest(with_service):
+    async def check(s):
+        await s.add_subscription(1, "Netflix", 1299, 15)
+        await s.set_reminder_pref(1, "dm")
+        first, has_prefs = await s.pending_digests(TODAY)
+        assert has_prefs and first[0].total == 1299
+        # Bypass the service write paths: the user is not dirty, so nothing is recomputed.
+        await s.conn.execute("UPDATE subscriptions SET amount_cents=1 WHERE user_id='1'")
+        again, _ = await s.pending_digests(TODAY)
+        assert again[0].total == 1299
+        assert again[0].digest_hash == first[0].digest_hash
+
+    with_service(check)
+
+
+def test_digest_expires_after_next_due_date(with_service):
+    async def check(s):
+        await s.add_expense(1, "Loyer", 80000, "2026-10-12")
+        await s.add_subscription(1, "Netflix", 1299, 15)
+        await s.set_reminder_pref(1, "dm")
+        await s.pending_digests(TODAY)
+        assert await _state(s, 1) == (0, "2026-10-12", "2026-10-12")
+
+        digests, _ = await s.pending_digests(date(2026, 10, 12))
+        assert (await _state(s, 1))[0] == 0
+        assert digests[0].total == 81299
+
+        digests, _ = await s.pending_digests(date(2026, 10, 13))
+        assert digests[0].total == 1299
+        assert digests[0].expenses_due == []
+        assert await _state(s, 1) == (0, "2026-10-15", "2026-10-15")
+
+    with_service(check)
+
+
+def test_digest_expires_at_month_end(with_service):
+    async def check(s):
+        await s.set_reminder_pref(1, "dm")
+        await s.pending_digests(TODAY)
+        assert await _state(s, 1) == (0, "2026-10-31", None)
+        await s.add_subscription(1, "Netflix", 1299, 5)
+        # Force the stored digest clean again to check that the month change alone expires it.
+        await s.conn.execute("UPDATE digest_state SET dirty=0")
+        digests, _ = await s.pending_digests(date(2026, 11, 1))
+        assert digests[0].subs_due == [["Netflix", 1299, 5]]
+
+    with_service(check)
+
+
+def test_quiet_mode_skips_unchanged_digest(with_service):
+    async def check(s):
+        await s.add_expense(1, "Loyer", 80000, "2026-10-20")
+        await s.set_reminder_pref(1, "dm", quiet=True, lookahead_days=3)
+        assert [d.user_id for d in await _sent(s, TODAY)] == ["1"]
+        assert await _sent(s, TODAY) == []
+        assert await _sent(s, date(2026, 10, 16)) == []
+
+        await s.add_expense(1, "Eau", 3000, "2026-10-30")
+        assert [d.user_id for d in await _sent(s, date(2026, 10, 16))] == ["1"]
+        assert await _sent(s, date(2026, 10, 16)) == []
+
+    with_service(check)
+
+
+def test_quiet_mode_sends_when_due_within_lookahead(with_service):
+    async def check(s):
+        await s.add_expense(1, "Loyer", 80000, "2026-10-20")
+        await s.set_reminder_pref(1, "dm", quiet=True, lookahead_days=3)
+        await _sent(s, TODAY)
+        assert await _sent(s, date(2026, 10, 16)) == []
+        assert [d.user_id for d in await _sent(s, date(2026, 10, 17))] == ["1"]
+        assert [d.user_id for d in await _sent(s, date(2026, 10, 18))] == ["1"]
+
+    with_service(check)
+
+
+def test_non_quiet_users_always_receive_digest(with_service):
+    async def check(s):
+        await s.set_reminder_pref(1, "dm")
+        await _sent(s, TODAY)
+        assert [d.user_id for d in await _sent(s, TODAY)] == ["1"]
+
+    with_service(check)
+
+
+def test_no_prefs_reported(with_service):
+    async def check(s):
+        assert await s.pending_digests(TODAY) == ([], False)
+
+    with_service(check)
+
+
+def test_failing_user_is_skipped_and_stays_dirty(with_service):
+    async def check(s):
+        await s.add_subscription(1, "Netflix", 1299, 15)
+        await s.add_subscription(2, "Broken", 100, 15)
+        await s.set_reminder_pref(1, "dm")
+        await s.set_reminder_pref(2, "dm")
+        await s.conn.execute(
+            "UPDATE subscriptions SET frequency='weekly', anchor_date='not-a-date' WHERE user_id='2'")
+        digests, has_prefs = await s.pending_digests(TODAY)
+        assert has_prefs
+        assert [d.user_id for d in digests] == ["1"]
+        assert (await _state(s, 2))[0] == 1
+
+    with_service(check)
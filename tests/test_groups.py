@@ -0,0 +1,180 @@
+from datetime import date
+
+from bot.services.recurrence import RecurrenceRule
+
+TODAY = date(2026, 10, 10)
+
+
+async def _household(s):
+    """Groupe de deux membres (1 propriétaire, 2) avec soldes, abonnements et dépenses."""
+    group = await s.create_group(1, "Maison")
+    assert await s.join_group(2, group.invite_code) is not None
+    await s.set_balance(1, 10000)
+    await s.set_balance(2, 5000)
+    await s.add_subscription(1, "Netflix", 1299, 15)
+    await s.add_subscription(2, "Gym", 1000, 28, RecurrenceRule("weekly", anchor=date(2026, 10, 1)))
+    await s.add_expense(2, "Loyer", 80000, "2026-10-12")
+    await s.add_expense(2, "Passé", 500, "2026-10-01")
+    return group
+
+
+def test_group_totals_aggregate_members(with_service):
+    async def check(s):
+        group = await _household(s)
+        await s.set_balance(3, 99999)
+        await s.add_expense(3, "Hors groupe", 100, "2026-10-20")
+        totals = await s.group_totals(group.id, TODAY)
+        assert totals.members == 2
+        assert totals.balance_cents == 15000
+        individual = [(await s.remaining_for_month(u, TODAY))[0] for u in (1, 2)]
+        assert totals.remaining_cents == sum(individual) == 1299 + 3 * 1000 + 80000
+        assert totals.next_due == "2026-10-12"
+
+    with_service(check)
+
+
+def test_group_totals_are_cached_until_a_member_writes(with_service):
+    async def check(s):
+        group = await _household(s)
+        before = await s.group_totals(group.id, TODAY)
+        # Bypass the write paths: the cached totals are served.
+        await s.conn.execute("UPDATE balances SET balance_cents=0")
+        assert await s.group_totals(group.id, TODAY) is before
+
+        await s.add_expense(2, "Eau", 3000, "2026-10-25")
+        after = await s.group_totals(group.id, TODAY)
+        assert after.remaining_cents == before.remaining_cents + 3000
+        assert after.balance_cents == 0
+
+    with_service(check)
+
+
+def test_group_totals_cache_is_per_day(with_service):
+    async def check(s):
+        group = await _household(s)
+        await s.group_totals(group.id, TODAY)
+        totals = await s.group_totals(group.id, date(2026, 10, 13))
+        assert totals.remaining_cents == 1299 + 3 * 1000
+
+    with_service(check)
+
+
+def test_member_write_marks_other_members_digest_dirty(with_service):
+    async def check(s):
+        await _household(s)
+        await s.set_reminder_pref(1, "dm")
+        digests, _ = await s.pending_digests(TODAY)
+        assert digests[0].group == ["Maison", 1299 + 3 * 1000 + 80000, 2]
+        await s.add_expense(2, "Eau", 3000, "2026-10-25")
+        digests, _ = await s.pending_digests(TODAY)
+        assert digests[0].group == ["Maison", 1299 + 3 * 1000 + 83000, 2]
+
+    with_service(check)
+
+
+def test_join_requires_invite_code(with_service):
+    async def check(s):
+        group = await s.create_group(1, "Maison")
+        assert group.invite_code
+        assert await s.join_group(2, str(group.id)) is None
+        assert await s.join_group(2, "") is None
+        assert await s.join_group(2, "  ") is None
+        joined = await s.join_group(2, f" {group.invite_code} ")
+        assert joined.id == group.id
+        assert await s.list_group_members(group.id) == ["1", "2"]
+
+    with_service(check)
+
+
+def test_only_owner_regenerates_invite(with_service):
+    async def check(s):
+        group = await s.create_group(1, "Maison")
+        await s.join_group(2, group.invite_code)
+        assert await s.regenerate_invite(2) is None
+        assert await s.regenerate_invite(3) is None
+        renewed = await s.regenerate_invite(1)
+        assert renewed.invite_code != group.invite_code
+        assert await s.join_group(3, group.invite_code) is None
+        assert (await s.join_group(3, renewed.invite_code)).id == group.id
+
+    with_service(check)
+
+
+def test_member_leaving_updates_totals(with_service):
+    async def check(s):
+        group = await _household(s)
+        await s.group_totals(group.id, TODAY)
+        await s.leave_group(2)
+        totals = await s.group_totals(group.id, TODAY)
+        assert totals.members == 1
+        assert totals.balance_cents == 10000
+        assert totals.remaining_cents == 1299
+        assert await s.get_user_group(2) is None
+
+    with_service(check)
+
+
+def test_joining_another_group_updates_both(with_service):
+    async def check(s):
+        group = await _household(s)
+        other = await s.create_group(3, "Colocation")
+        await s.group_totals(group.id, TODAY)
+        await s.join_group(2, other.invite_code)
+        assert (await s.group_totals(group.id, TODAY)).members == 1
+        moved = await s.group_totals(other.id, TODAY)
+        assert moved.members == 2
+        assert moved.balance_cents == 5000
+
+    with_service(check)
+
+
+def test_rejoining_own_group_is_a_no_op(with_service):
+    async def check(s):
+        group = await s.create_group(1, "Maison")
+        assert (await s.join_group(1, group.invite_code)).id == group.id
+        assert await s.get_group(group.id) is not None
+        assert await s.list_group_members(group.id) == ["1"]
+
+    with_service(check)
+
+
+def test_owner_leaving_hands_over_and_revokes_invite(with_service):
+    async def check(s):
+        group = await _household(s)
+        await s.join_group(3, group.invite_code)
+        await s.leave_group(1)
+        current = await s.get_group(group.id)
+        assert current.owner_id == "2"
+        assert current.invite_code is None
+        assert await s.join_group(4, group.invite_code) is None
+        renewed = await s.regenerate_invite(2)
+        assert renewed is not None and renewed.invite_code
+        assert (await s.join_group(4, renewed.invite_code)).id == group.id
+
+    with_service(check)
+
+
+def test_owner_creating_new_group_hands_over_old_one(with_service):
+    async def check(s):
+        group = await _household(s)
+        await s.create_group(1, "Autre")
+        old = await s.get_group(group.id)
+        assert old.owner_id == "2"
+        assert old.invite_code is None
+        assert await s.list_group_members(group.id) == ["2"]
+
+    with_service(check)
+
+
+def test_last_member_leaving_deletes_group(with_service):
+    async def check(s):
+        group = await _household(s)
+        await s.group_totals(group.id, TODAY)
+        await s.leave_group(2)
+        await s.leave_group(1)
+        assert await s.get_group(group.id) is None
+        assert await s.group_totals(group.id, TODAY) is None
+        assert group.id not in s._group_totals
+        assert await s.join_group(3, group.invite_code) is None
+
+    with_service(check)
@@ -0,0 +1,87 @@
+from datetime import date
+
+import pytest
+
+from bot.services.recurrence import RecurrenceRule, month_end, occurrences
+
+
+def _between(rule, start, end):
+    return list(occurrences(rule, date.fromisoformat(start), date.fromisoformat(end)))
+
+
+def test_monthly_default_day():
+    rule = RecurrenceRule(day_of_month=15)
+    assert _between(rule, "2026-01-16", "2026-03-31") == [date(2026, 2, 15), date(2026, 3, 15)]
+
+
+def test_monthly_last_day_follows_month_length():
+    rule = RecurrenceRule(last_day=True)
+    assert _between(rule, "2024-01-01", "2024-04-30") == [
+        date(2024, 1, 31), date(2024, 2, 29), date(2024, 3, 31), date(2024, 4, 30),
+    ]
+
+
+def test_every_n_months_phase_from_anchor():
+    rule = RecurrenceRule(interval=3, day_of_month=10, anchor=date(2025, 11, 1))
+    assert _between(rule, "2025-01-01", "2026-12-31") == [
+        date(2025, 11, 10), date(2026, 2, 10), date(2026, 5, 10), date(2026, 8, 10), date(2026, 11, 10),
+    ]
+
+
+def test_monthly_skips_occurrence_before_anchor():
+    rule = RecurrenceRule(interval=2, day_of_month=5, anchor=date(2026, 1, 20))
+    assert _between(rule, "2026-01-01", "2026-05-31") == [date(2026, 3, 5), date(2026, 5, 5)]
+
+
+def test_weekly_phase_across_months():
+    rule = RecurrenceRule(frequency="weekly", interval=2, anchor=date(2026, 1, 5))
+    assert _between(rule, "2026-01-01", "2026-02-28") == [
+        date(2026, 1, 5), date(2026, 1, 19), date(2026, 2, 2), date(2026, 2, 16),
+    ]
+
+
+def test_weekly_window_starting_mid_cycle():
+    rule = RecurrenceRule(frequency="weekly", interval=3, anchor=date(2026, 3, 4))
+    assert _between(rule, "2026-03-20", "2026-04-30") == [date(2026, 3, 25), date(2026, 4, 15)]
+
+
+def test_yearly_leap_day_falls_back_to_month_end():
+    rule = RecurrenceRule(frequency="yearly", anchor=date(2024, 2, 29))
+    assert _between(rule, "2024-01-01", "2028-12-31") == [
+        date(2024, 2, 29), date(2025, 2, 28), date(2026, 2, 28), date(2027, 2, 28), date(2028, 2, 29),
+    ]
+
+
+def test_yearly_interval():
+    rule = RecurrenceRule(frequency="yearly", interval=2, anchor=date(2025, 3, 14))
+    assert _between(rule, "2025-01-01", "2030-12-31") == [date(2025, 3, 14), date(2027, 3, 14), date(2029, 3, 14)]
+
+
+def test_occurrences_is_lazy_over_long_windows():
+    rule = RecurrenceRule(day_of_month=1)
+    gen = occurrences(rule, date(2026, 1, 1), date(9999, 12, 31))
+    assert next(gen) == date(2026, 1, 1)
+    assert next(gen) == date(2026, 2, 1)
+
+
+def test_single_day_window():
+    rule = RecurrenceRule(frequency="weekly", anchor=date(2026, 10, 1))
+    assert _between(rule, "2026-10-08", "2026-10-08") == [date(2026, 10, 8)]
+    assert _between(rule, "2026-10-09", "2026-10-09") == []
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"frequency": "daily"},
+    {"interval": 0},
+    {"frequency": "weekly"},
+    {"frequency": "yearly"},
+    {"interval": 2},
+])
+def test_invalid_rules(kwargs):
+    with pytest.raises(ValueError):
+        RecurrenceRule(**kwargs)
+
+
+def test_month_end():
+    assert month_end(date(2026, 2, 10)) == date(2026, 2, 28)
+    assert month_end(date(2024, 2, 10)) == date(2024, 2, 29)